@@ -1,8 +1,8 @@
-import axios from "axios";
 import { getLLMConfig, setupLog } from "./src/setup-env";
-import { LLMConfig } from "./src/translate";
+import { LLMConfig, getClient } from "./src/translate";
 import log from "loglevel";
 import { readFileSync, readJSONSync, writeJSONSync } from 'fs-extra'
+import { writeFileAtomic } from "./src/io";
 
 // const prompt = `你是一位经验丰富的本地化工作者，你现在需要将日语游戏文本翻译为中文。
 
@@ -39,13 +39,7 @@ async function getTranslation(
   }: LLMConfig
 ) {
   try {
-    const openai = axios.create({
-      baseURL,
-      headers: {
-        "Content-Type": "application/json",
-        Authorization: `Bearer ${apiKey}`,
-      },
-    });
+    const openai = getClient({ apiKey, baseURL });
     log.info(`Sending request to ${model} API, please wait...`);
     const response = await openai.post(
       "/v1/chat/completions",
@@ -192,10 +186,8 @@ async function main() {
     const translationTable = parseCsvFormatLocalization(rtn)
     applyTranslatedLocalization(l10nObj, translationTable)
     // console.log(lFile)
-    writeJSONSync(targetPath, l10nObj, {
-      "encoding": "utf-8",
-      "spaces": 2,
-    })
+    // checkpoint used to resume; must not be left half-written
+    await writeFileAtomic(targetPath, JSON.stringify(l10nObj, null, 2) + "\n")
     untranslated = countUntranslatedLines(l10nObj)
   }
   const tmp = {}
@@ -1,21 +1,61 @@
 import os,json
 import posixpath
+from concurrent.futures import ProcessPoolExecutor
 from imas_tools.story.story_csv import StoryCsv
 
 data_dir = "./data"
+# origin of each csv from the last run, reused while mtime and size are unchanged
+cache_path = "./.index_cache.json"
+
+
+def read_origin(file_path):
+    with open(file_path, "r", encoding="utf-8") as f:
+        # StoryCsv splits the text itself, no need to build a line list first
+        story_csv = StoryCsv(f.read())
+        return story_csv.origin
+
+
+def load_cache():
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
 
 if __name__ == "__main__":
-    index = {}
+    csv_files = []
     for subdir, _, files in os.walk(data_dir):
         for file in files:
             if not file.endswith(".csv"):
                 continue
-            file_path = posixpath.join(subdir, file)
-            with open(file_path, "r", encoding="utf-8") as f:
-                # print(file_path)
-                # print(f.readlines())
-                story_csv = StoryCsv("".join(f.readlines()))
-                index[story_csv.origin] = file_path
+            csv_files.append(posixpath.join(subdir, file))
+
+    cache = load_cache()
+    new_cache = {}
+    stale_files = []
+    for file_path in csv_files:
+        st = os.stat(file_path)
+        entry = cache.get(file_path)
+        if entry and entry["mtime"] == st.st_mtime_ns and entry["size"] == st.st_size:
+            new_cache[file_path] = entry
+        else:
+            new_cache[file_path] = {"mtime": st.st_mtime_ns, "size": st.st_size}
+            stale_files.append(file_path)
+
+    # each csv is parsed independently, so spread them over worker processes
+    if stale_files:
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
+            for file_path, origin in zip(stale_files, ex.map(read_origin, stale_files, chunksize=32)):
+                new_cache[file_path]["origin"] = origin
+
+    index = {}
+    for file_path in csv_files:
+        index[new_cache[file_path]["origin"]] = file_path
 
     with open("./index.json", "w", encoding="utf-8") as f:
         json.dump(index, f, ensure_ascii=False, indent=4)
+
+    with open(cache_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(new_cache, f, ensure_ascii=False)
+    os.replace(cache_path + ".tmp", cache_path)
@@ -1,12 +1,42 @@
 import fs from "fs-extra";
-import { resolve, basename, join } from "path";
+import { resolve, basename, join, dirname } from "path";
 import log from 'loglevel'
 import { LLMConfig, translateCsvString, translateJsonDataToCsvString } from "../src/translate";
 import { getLLMConfig, setupLog, getRemoteEndpoint } from "../src/setup-env"
-import { program } from "commander";
+import { program, InvalidArgumentError } from "commander";
 import axios from "axios";
 import { walkSync } from "@nodelib/fs.walk";
-import { extractInfoFromCsvText } from "../src/csv";
+import { CsvTextInfo, extractInfoFromCsvText } from "../src/csv";
+import { writeFileAtomic } from "../src/io";
+
+// run worker on items, keeping at most `limit` calls in flight.
+// a failing item does not stop the others: the pool drains first and the
+// first error is rethrown afterwards, so no work is left in flight
+async function runWithConcurrency<T>(
+  items: T[],
+  limit: number,
+  worker: (item: T) => Promise<void>
+) {
+  if (!Number.isInteger(limit) || limit < 1) {
+    throw new Error(`concurrency must be a positive integer, got ${limit}`);
+  }
+  let next = 0;
+  const errors: unknown[] = [];
+  const runners = Array.from({ length: Math.min(limit, items.length) }, async () => {
+    while (next < items.length) {
+      const item = items[next++];
+      try {
+        await worker(item);
+      } catch (error) {
+        errors.push(error);
+      }
+    }
+  });
+  await Promise.all(runners);
+  if (errors.length > 0) {
+    throw errors[0];
+  }
+}
 
 // translate files in tmp
 async function translateFolder(
@@ -15,6 +45,7 @@ async function translateFolder(
   destFolder = "./tmp/translated",
   skipExisted = true,
   indexFile?: string, // ./index.json
+  concurrency = 4,
 ) {
   const files = [];
   const entrys = walkSync(folder);
@@ -33,44 +64,48 @@ async function translateFolder(
 
   log.info("Found " + files.length + " csv files to translate");
 
-  for (const entry of files) {
+  await runWithConcurrency(files, concurrency, async (entry) => {
     log.info("Translating " + entry.name);
     const filePath = entry.path;
 
     if (entry.name.endsWith(".json")) {
       log.warn("JSON file is currently not supported");
-      continue;
+      return;
     }
 
-    const csvString = await fs.promises.readFile(filePath, "utf-8");
-    const csvInfo = extractInfoFromCsvText(csvString);
+    let csvString: string;
+    let csvInfo: CsvTextInfo;
+    try {
+      csvString = await fs.promises.readFile(filePath, "utf-8");
+      csvInfo = extractInfoFromCsvText(csvString);
+    } catch (error) {
+      log.error(`failed to read ${entry.path}: ${error.message}`)
+      return;
+    }
 
     if (indexFileContent[csvInfo.jsonUrl]) {
       log.info(`Skipped ${csvInfo.jsonUrl} because of file already translated`);
-      continue;
+      return;
     }
 
     const destPath = resolve(destFolder, csvInfo.jsonUrl.replace(".txt", ".csv"));
     if (skipExisted && fs.existsSync(destPath)) {
       log.info(`Skipped ${destPath} because of file existence`);
-      continue;
+      return;
     }
 
     if (entry.name.endsWith(".csv")) {
       try {
         const translatedCsvString = await translateCsvString(csvString, config);
 
-        await fs.promises.writeFile(
-          destPath,
-          translatedCsvString,
-          "utf-8"
-        );
+        await fs.ensureDir(dirname(destPath));
+        await writeFileAtomic(destPath, translatedCsvString);
         log.info(`Output to ${destPath}`);
       } catch (error) {
         log.error(`failed to translate ${entry.path}`)
       }
     }
-  }
+  });
 }
 
 async function getJsonPathList(diffEndpoint: string) {
@@ -98,15 +133,19 @@ async function translateRemoteDiff(
     const jsonContent = (await axios.get(join(assetEndpoint, jsonPath))).data;
     log.debug(`translating json with ${jsonContent.length} frames`)
     const translatedCsvString = await translateJsonDataToCsvString(jsonContent, jsonPath.replace("json/", ""), config);
-    await fs.writeFile(
-      destPath,
-      translatedCsvString,
-      "utf-8"
-    );
+    await writeFileAtomic(destPath, translatedCsvString);
     log.info(`Output to ${destPath}`);
   }
 }
 
+function parseConcurrency(value: string) {
+  const concurrency = Number(value);
+  if (!/^\d+$/.test(value) || concurrency < 1) {
+    throw new InvalidArgumentError("must be a positive integer.");
+  }
+  return concurrency;
+}
+
 async function main() {
   setupLog()
   program
@@ -119,6 +158,11 @@ async function main() {
       "--dir <dir>",
       "the source directory where the files are located, only activated when type is folder",
       "./tmp/untranslated"
+  )
+    .option(
+      "--dest <dest>",
+      "the directory where translated files are written, only activated when type is folder. Use ./data to skip the move step",
+      "./tmp/translated"
   )
     .option(
       "--tag <tag>",
@@ -138,16 +182,24 @@ async function main() {
       "--ignoreindex",
       "whether to ignore index files, default to false (always consider index file)",
     )
+    .option(
+      "--concurrency <concurrency>",
+      "the number of files translated at the same time, only activated when type is folder",
+      parseConcurrency,
+      4
+    )
   await program.parseAsync(process.argv);
   const opts = program.opts();
 
   const config = getLLMConfig();
   if (opts.type === "folder") {
     log.info("Source File Directory:", opts.dir)
+    log.info("Output Directory:", opts.dest)
     log.info("overwrite files:", !!opts.overwrite);
     log.info("ignore index:", opts.ignoreindex);
     log.info("using index file:", opts.ignoreindex ? undefined : opts.indexfile);
-    await translateFolder(config, opts.dir, opts.dest, !opts.overwrite, opts.ignoreindex?undefined:opts.indexfile);
+    log.info("concurrency:", opts.concurrency);
+    await translateFolder(config, opts.dir, opts.dest, !opts.overwrite, opts.ignoreindex?undefined:opts.indexfile, opts.concurrency);
   } else if (opts.type === "remote-diff") {
     const { diffEndpoint, assetEndpoint } = getRemoteEndpoint();
     log.info("Remote Diff Endpoint:", `${diffEndpoint}?latest=${opts.tag}`)
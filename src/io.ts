@@ -0,0 +1,32 @@
+import fs from "fs-extra";
+import { randomBytes } from "crypto";
+
+// temp files of writes still in flight, removed if the run is interrupted
+// (e.g. `translate:folder --dest ./data` stopped with Ctrl-C)
+const pendingTmpPaths = new Set<string>();
+
+for (const signal of ["SIGINT", "SIGTERM"] as const) {
+  process.once(signal, () => {
+    for (const tmpPath of pendingTmpPaths) {
+      fs.rmSync(tmpPath, { force: true });
+    }
+    process.exit(signal === "SIGINT" ? 130 : 143);
+  });
+}
+
+// write to a sibling temp file first so an interrupted run never leaves a
+// truncated file behind (translated files are skipped once they exist)
+export async function writeFileAtomic(filePath: string, content: string) {
+  const tmpPath = `${filePath}.${randomBytes(4).toString("hex")}.tmp`;
+  pendingTmpPaths.add(tmpPath);
+  try {
+    await fs.promises.writeFile(tmpPath, content, "utf-8");
+    await fs.promises.rename(tmpPath, filePath);
+  } catch (error) {
+    // the random suffix means a leftover would never be reused; drop it
+    await fs.promises.rm(tmpPath, { force: true });
+    throw error;
+  } finally {
+    pendingTmpPaths.delete(tmpPath);
+  }
+}
@@ -1,8 +1,16 @@
 import log from "loglevel";
 // const log = console
-import axios from "axios";
+import axios, { AxiosInstance } from "axios";
+import fs from "fs-extra";
+import { createHash } from "crypto";
+import { join } from "path";
 import { systemPrompt, chinesePrompt } from "./prompts";
 import { CsvTextInfo, toCsvText, jsonTextToCsvText, extractInfoFromCsvText, } from "./csv"
+import { writeFileAtomic } from "./io";
+
+// validated model outputs, keyed by model + prompt + input, so reruns after
+// a partial failure do not pay for batches that already succeeded
+const responseCacheDir = "./tmp/cache"
 
 interface Dialogue {
   name: string;
@@ -65,7 +73,13 @@ export async function translateJsonDataToCsvString(data: any[], jsonPath: string
 // will modify csvTextInfo
 async function translateCsvTextInfo(csvTextInfo: CsvTextInfo, config: LLMConfig, leftRetry=0) {
   const userInput = DialogueListDeser.serialize(csvTextInfo.data)
-  const gptOutput = await chat(userInput, config)
+  const cacheKey = createHash("sha1").update(`${config.model}|${chinesePrompt}|${userInput}`).digest("hex")
+  const cacheFile = join(responseCacheDir, `${cacheKey}.txt`)
+  const cached = fs.existsSync(cacheFile)
+  if (cached) {
+    log.debug(`Using cached response ${cacheFile}`)
+  }
+  const gptOutput = cached ? await fs.readFile(cacheFile, "utf-8") : await chat(userInput, config)
   const translatedDialogues = DialogueListDeser.deserialize(gptOutput)
   if (csvTextInfo.data.length != translatedDialogues.length) {
     log.error(`Error: length of data (${csvTextInfo.data.length}) and translatedDialogues (${translatedDialogues.length}) is not equal`)
@@ -75,6 +89,10 @@ async function translateCsvTextInfo(csvTextInfo: CsvTextInfo, config: LLMConfig,
     }
     throw new Error("error: length of data and translatedDialogues is not equal")
   }
+  if (!cached) {
+    await fs.ensureDir(responseCacheDir)
+    await writeFileAtomic(cacheFile, gptOutput)
+  }
   for (let index = 0; index < translatedDialogues.length; index++) {
     const dialogue = translatedDialogues[index];
     if (dialogue == undefined) {
@@ -120,23 +138,39 @@ const DialogueListDeser = {
   }
 }
 
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms))
+
+const clients = new Map<string, AxiosInstance>()
+
+// created on first use and shared by every request to the same endpoint
+export function getClient({ apiKey, baseURL }: Pick<LLMConfig, "apiKey" | "baseURL">) {
+  const key = `${baseURL}|${apiKey}`
+  if (!clients.has(key)) {
+    clients.set(key, axios.create({
+      baseURL,
+      headers: {
+        "Content-Type": "application/json",
+        Authorization: `Bearer ${apiKey}`,
+      },
+    }))
+  }
+  return clients.get(key)
+}
+
 export async function chat(
   userInput: string,
-  {
+  config: LLMConfig,
+  leftRetry = 5,
+  backoff = 2000,
+) {
+  const {
     apiKey,
     baseURL,
     model,
     max_tokens,
-  }: LLMConfig
-) {
+  } = config
   try {
-    const openai = axios.create({
-      baseURL,
-      headers: {
-        "Content-Type": "application/json",
-        Authorization: `Bearer ${apiKey}`,
-      },
-    });
+    const openai = getClient({ apiKey, baseURL });
     log.info(`Sending request to ${model} API, please wait...`);
     const response = await openai.post(
       "/v1/chat/completions",
@@ -162,6 +196,12 @@ export async function chat(
     log.debug(`Consumed token: ${tokenConsumed}`);
     return generatedText;
   } catch (error) {
+    // rate limited: back off exponentially instead of failing the whole batch
+    if (error.response?.status === 429 && leftRetry > 0) {
+      log.warn(`Rate limited, retrying in ${backoff}ms...`)
+      await sleep(backoff)
+      return await chat(userInput, config, leftRetry - 1, backoff * 2)
+    }
     log.error(`Error: ${error.message}`);
     log.error(`Error: ${error.response.data.error.message}`);
     throw new Error(error.response.data.error.message);